@@ -4,47 +4,125 @@ Change detection module for monitoring website changes
 import os
 import json
 import hashlib
+import functools
 import logging
-from typing import Dict, Optional, List, Set
+import ahocorasick
+import msgpack
+import xxhash
+import zstandard as zstd
+from typing import Dict, Optional, List, Set, Tuple
 from pathlib import Path
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from lxml import html as lxml_html
 from urllib.parse import urljoin, urlparse
 import re
 
 logger = logging.getLogger(__name__)
 
+# Only these tags are ever consumed downstream (links, images, update
+# indicators), so parsing anything else is wasted work
+_CONTENT_STRAINER = SoupStrainer(['a', 'img', 'time', 'span', 'div', 'p', 'h1', 'h2', 'h3'])
+
+# Elements excluded from the content hash
+_NOISE_TAGS = ('script', 'style', 'nav', 'footer', 'header')
+
+@functools.lru_cache(maxsize=1024)
+def _url_to_state_filename(url: str) -> str:
+    """Map a URL to its state file name
+
+    SHA-256 is hardware-accelerated on current x86/ARM, and the cache
+    avoids recomputing for the load/save pair within a run.
+    """
+    return f"state_{hashlib.sha256(url.encode()).hexdigest()[:32]}.msgpack.zst"
+
+
+# Patterns for update-indicator extraction, compiled once at import
+_DATE_CLS_RE = re.compile(r'date|time|updated|modified', re.I)
+_VERSION_NUM_RE = re.compile(r'v\d+', re.I)
+
+# One Aho-Corasick automaton over all indicator keywords replaces the
+# per-category regex scans: a single linear pass per string, no
+# backtracking
+_INDICATOR_KEYWORDS = {
+    'new_indicators': ('new', 'updated', '追加', '更新', '変更'),
+    'version_indicators': ('version', 'バージョン'),
+}
+_INDICATOR_AUTOMATON = ahocorasick.Automaton()
+for _category, _words in _INDICATOR_KEYWORDS.items():
+    for _word in _words:
+        _INDICATOR_AUTOMATON.add_word(_word, _category)
+_INDICATOR_AUTOMATON.make_automaton()
+
 
 class ChangeDetector:
     def __init__(self, state_dir: Path):
         self.state_dir = state_dir
         self.state_dir.mkdir(exist_ok=True)
+
+        # Per-URL cache of loaded state, so the conditional-header
+        # lookup and detect_changes don't decompress the same file
+        # twice per run; workers touch disjoint URLs, so no locking
+        self._state_cache: Dict[str, Optional[Dict]] = {}
     
-    def detect_changes(self, url: str, html_content: str) -> Optional[Dict]:
+    def detect_changes(self, url: str, html_content: str,
+                       response_meta: Optional[Dict] = None) -> Optional[Dict]:
         """
         Detect changes in website content
-        
+
         Args:
             url: URL being monitored
             html_content: Current HTML content
-            
+            response_meta: Optional dict with 'etag' and 'last_modified'
+                from the HTTP response, persisted for conditional GETs
+
         Returns:
             Dictionary with change information, or None if no changes
         """
         try:
-            # Parse HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Extract various content types
-            current_state = self._extract_content_state(soup, url)
-            
             # Load previous state
             previous_state = self._load_state(url)
+
+            # Phase 1: hash the page text; equality with the stored hash
+            # means an unchanged page, so skip extraction entirely
+            content_hash, text_length = self._hash_text_content(html_content)
+            if previous_state and previous_state.get('content_hash') == content_hash:
+                # Persist rotated HTTP validators even without content
+                # changes, or the next run re-sends stale ones and never
+                # gets a 304 again; otherwise just refresh the mtime
+                if response_meta and (
+                        previous_state.get('etag') != response_meta.get('etag')
+                        or previous_state.get('last_modified') != response_meta.get('last_modified')):
+                    previous_state['etag'] = response_meta.get('etag')
+                    previous_state['last_modified'] = response_meta.get('last_modified')
+                    self._save_state(url, previous_state)
+                else:
+                    self.touch_state(url)
+                return None
+
+            # Phase 2: parse only the tags we actually consume and
+            # extract the full content state
+            soup = BeautifulSoup(html_content, 'lxml', parse_only=_CONTENT_STRAINER)
+            current_state = self._extract_content_state(soup, url, content_hash, text_length)
+
+            # The id->URL indexes are per-run only, never persisted
+            links_index = current_state.pop('links_index')
+            images_index = current_state.pop('images_index')
+
+            # Keep HTTP validators so the next fetch can short-circuit
+            # with 304 Not Modified
+            if response_meta:
+                current_state['etag'] = response_meta.get('etag')
+                current_state['last_modified'] = response_meta.get('last_modified')
             
             # Compare states
-            changes = self._compare_states(previous_state, current_state)
-            
-            # Save current state
-            self._save_state(url, current_state)
+            changes = self._compare_states(previous_state, current_state,
+                                           links_index, images_index)
+
+            # Save current state; skip the rewrite when nothing changed,
+            # since the stored state is already identical
+            if changes:
+                self._save_state(url, current_state)
             
             if changes:
                 return {
@@ -59,110 +137,162 @@ class ChangeDetector:
             logger.error(f"Error detecting changes for {url}: {e}")
             return None
     
-    def _extract_content_state(self, soup: BeautifulSoup, url: str) -> Dict:
+    def touch_state(self, url: str) -> None:
+        """Refresh the state file's mtime
+
+        Keeps cleanup_old_states from reaping actively monitored URLs
+        whose state hasn't needed a rewrite in a while.
+        """
+        state_file = self._get_state_file_path(url)
+        if state_file.exists():
+            os.utime(state_file)
+
+    def get_conditional_headers(self, url: str) -> Dict[str, Optional[str]]:
+        """Get stored ETag/Last-Modified values for conditional requests"""
+        state = self._load_state(url)
+        if not state:
+            return {'etag': None, 'last_modified': None}
+        return {
+            'etag': state.get('etag'),
+            'last_modified': state.get('last_modified')
+        }
+
+    def _hash_text_content(self, html_content: str) -> Tuple[str, int]:
+        """Hash the page's text content incrementally
+
+        Text comes from a plain lxml tree with noise tags stripped.
+        Each chunk is split on whitespace (str.split runs in C and
+        collapses Unicode whitespace), so markup reflows don't register
+        as content changes, and fed straight into an xxh3 hasher without
+        ever materializing the full page text.
+
+        Returns:
+            Tuple of (content hash hex digest, normalized text length)
+        """
+        try:
+            try:
+                root = lxml_html.fromstring(html_content)
+            except ValueError:
+                # lxml refuses str input carrying an XML encoding
+                # declaration (typical XHTML); reparse as bytes, where
+                # the declaration is legal
+                root = lxml_html.fromstring(html_content.encode('utf-8'))
+        except etree.ParserError:
+            # Empty or comment-only documents have no text; hash them as
+            # such so the normal compare/save path still runs
+            return xxhash.xxh3_128().hexdigest(), 0
+
+        etree.strip_elements(root, *_NOISE_TAGS, with_tail=False)
+
+        hasher = xxhash.xxh3_128()
+        text_length = 0
+        for chunk in root.itertext():
+            for word in chunk.split():
+                hasher.update(word.encode('utf-8'))
+                hasher.update(b' ')
+                text_length += len(word) + 1
+
+        return hasher.hexdigest(), text_length
+
+    def _extract_content_state(self, soup: BeautifulSoup, url: str,
+                               content_hash: str, text_length: int) -> Dict:
         """Extract current state of website content"""
         import time
-        
-        # Extract PDF links
-        pdf_links = self._extract_pdf_links(soup, url)
-        
-        # Extract text content (removing scripts, styles, etc.)
-        for element in soup(['script', 'style', 'nav', 'footer', 'header']):
-            element.decompose()
-        
-        text_content = soup.get_text()
-        text_content = re.sub(r'\s+', ' ', text_content).strip()
-        
-        # Extract links
-        links = self._extract_links(soup, url)
-        
-        # Extract images
-        images = self._extract_images(soup, url)
-        
+
+        # Extract PDF links, plain links and images in one DOM walk
+        pdf_links, links_index, images_index = self._extract_dom_items(soup, url)
+
         # Extract specific elements that might indicate updates
         update_indicators = self._extract_update_indicators(soup)
-        
-        # Calculate content hash
-        content_hash = hashlib.md5(text_content.encode('utf-8')).hexdigest()
-        
+
         return {
             'timestamp': time.time(),
             'content_hash': content_hash,
-            'text_length': len(text_content),
+            'text_length': text_length,
             'pdf_links': pdf_links,
-            'links': links,
-            'images': images,
+            # Persist only the sorted id columns; the id->URL indexes
+            # are popped off by detect_changes for rendering added items
+            'links': sorted(links_index),
+            'images': sorted(images_index),
+            'links_index': links_index,
+            'images_index': images_index,
             'update_indicators': update_indicators
         }
     
-    def _extract_pdf_links(self, soup: BeautifulSoup, base_url: str) -> List[Dict]:
-        """Extract PDF links from page"""
-        pdf_links = []
-        
-        # Find all links
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            absolute_url = urljoin(base_url, href)
-            
-            # Check if it's a PDF link
-            if href.lower().endswith('.pdf') or 'pdf' in href.lower():
-                pdf_links.append({
-                    'url': absolute_url,
-                    'text': link.get_text(strip=True),
-                    'title': link.get('title', ''),
-                    'hash': hashlib.md5(absolute_url.encode()).hexdigest()[:8]
-                })
-        
-        return pdf_links
-    
-    def _extract_links(self, soup: BeautifulSoup, base_url: str) -> List[str]:
-        """Extract all links from page"""
-        links = []
-        
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            absolute_url = urljoin(base_url, href)
-            
-            # Filter out unwanted links
-            if not any(skip in absolute_url.lower() for skip in ['javascript:', 'mailto:', 'tel:']):
-                links.append(absolute_url)
-        
-        return list(set(links))  # Remove duplicates
-    
-    def _extract_images(self, soup: BeautifulSoup, base_url: str) -> List[str]:
-        """Extract image URLs from page"""
-        images = []
-        
-        for img in soup.find_all('img', src=True):
-            src = img['src']
-            absolute_url = urljoin(base_url, src)
-            images.append(absolute_url)
-        
-        return list(set(images))  # Remove duplicates
+    def _extract_dom_items(self, soup: BeautifulSoup, base_url: str) -> Tuple[List[Dict], Dict[int, str], Dict[int, str]]:
+        """Extract PDF links, plain links and images in a single DOM walk
+
+        Links and images are keyed by a 64-bit xxh3 hash of the URL;
+        state stores only the id column, the dicts map ids back to URLs
+        for the current run. PDF links come back as parallel columns
+        ('hashes', 'urls', 'texts') so comparison can load just the
+        hash column.
+        """
+        pdf_links = {'hashes': [], 'urls': [], 'texts': []}
+        links: Dict[int, str] = {}
+        images: Dict[int, str] = {}
+
+        for element in soup.find_all(['a', 'img']):
+            if element.name == 'a':
+                href = element.get('href')
+                if not href:
+                    continue
+                absolute_url = urljoin(base_url, href)
+
+                # Check if it's a PDF link
+                if href.lower().endswith('.pdf') or 'pdf' in href.lower():
+                    pdf_links['hashes'].append(hashlib.md5(absolute_url.encode()).hexdigest()[:8])
+                    pdf_links['urls'].append(absolute_url)
+                    pdf_links['texts'].append(element.get_text(strip=True))
+
+                # Filter out unwanted links
+                if not any(skip in absolute_url.lower() for skip in ['javascript:', 'mailto:', 'tel:']):
+                    links[xxhash.xxh3_64_intdigest(absolute_url.encode('utf-8'))] = absolute_url
+            else:
+                src = element.get('src')
+                if src:
+                    absolute_url = urljoin(base_url, src)
+                    images[xxhash.xxh3_64_intdigest(absolute_url.encode('utf-8'))] = absolute_url
+
+        return pdf_links, links, images
     
     def _extract_update_indicators(self, soup: BeautifulSoup) -> Dict:
         """Extract elements that commonly indicate updates"""
         indicators = {}
         
         # Look for date/time elements
-        date_elements = soup.find_all(['time', 'span', 'div'], 
-                                     class_=re.compile(r'date|time|updated|modified', re.I))
+        date_elements = soup.find_all(['time', 'span', 'div'], class_=_DATE_CLS_RE)
         if date_elements:
             indicators['date_elements'] = [elem.get_text(strip=True) for elem in date_elements[:5]]
-        
-        # Look for "new" or "updated" badges
-        new_elements = soup.find_all(text=re.compile(r'new|updated|追加|更新|変更', re.I))
-        if new_elements:
-            indicators['new_indicators'] = [elem.strip() for elem in new_elements[:10]]
-        
-        # Look for version numbers
-        version_elements = soup.find_all(text=re.compile(r'version|v\d+|バージョン', re.I))
-        if version_elements:
-            indicators['version_indicators'] = [elem.strip() for elem in version_elements[:5]]
+
+        # Look for "new"/"updated" badges and version numbers in one
+        # walk over the tree's strings
+        new_indicators = []
+        version_indicators = []
+        for element in soup.strings:
+            lower_text = element.lower()
+            categories = {category for _, category in _INDICATOR_AUTOMATON.iter(lower_text)}
+            if 'version_indicators' not in categories and _VERSION_NUM_RE.search(lower_text):
+                categories.add('version_indicators')
+
+            if 'new_indicators' in categories and len(new_indicators) < 10:
+                new_indicators.append(element.strip())
+            if 'version_indicators' in categories and len(version_indicators) < 5:
+                version_indicators.append(element.strip())
+
+            if len(new_indicators) >= 10 and len(version_indicators) >= 5:
+                break
+
+        if new_indicators:
+            indicators['new_indicators'] = new_indicators
+        if version_indicators:
+            indicators['version_indicators'] = version_indicators
         
         return indicators
     
-    def _compare_states(self, previous: Optional[Dict], current: Dict) -> Optional[Dict]:
+    def _compare_states(self, previous: Optional[Dict], current: Dict,
+                        links_index: Dict[int, str],
+                        images_index: Dict[int, str]) -> Optional[Dict]:
         """Compare previous and current states to detect changes"""
         if not previous:
             return {
@@ -183,12 +313,12 @@ class ChangeDetector:
             changes['pdf_changes'] = pdf_changes
         
         # Check link changes
-        link_changes = self._compare_lists(previous['links'], current['links'])
+        link_changes = self._compare_lists(previous['links'], current['links'], links_index)
         if link_changes:
             changes['link_changes'] = link_changes
-        
+
         # Check image changes
-        image_changes = self._compare_lists(previous['images'], current['images'])
+        image_changes = self._compare_lists(previous['images'], current['images'], images_index)
         if image_changes:
             changes['image_changes'] = image_changes
         
@@ -198,73 +328,141 @@ class ChangeDetector:
         
         return changes if changes else None
     
-    def _compare_pdf_links(self, previous: List[Dict], current: List[Dict]) -> Optional[Dict]:
-        """Compare PDF links between states"""
-        prev_hashes = {pdf['hash'] for pdf in previous}
-        curr_hashes = {pdf['hash'] for pdf in current}
-        
+    def _compare_pdf_links(self, previous: Dict[str, List], current: Dict[str, List]) -> Optional[Dict]:
+        """Compare PDF links between states
+
+        Only the hash columns are diffed; url/text are materialized just
+        for the (usually tiny) added/removed index sets.
+        """
+        if isinstance(previous, list):
+            # Legacy list-of-dicts state from before the column split
+            previous = {
+                'hashes': [pdf['hash'] for pdf in previous],
+                'urls': [pdf['url'] for pdf in previous],
+                'texts': [pdf['text'] for pdf in previous]
+            }
+
+        prev_hashes = set(previous['hashes'])
+        curr_hashes = set(current['hashes'])
+
         added = curr_hashes - prev_hashes
         removed = prev_hashes - curr_hashes
-        
+
         if added or removed:
             result = {}
-            
+
             if added:
-                result['added'] = [pdf for pdf in current if pdf['hash'] in added]
-            
+                result['added'] = [
+                    {'url': current['urls'][i], 'text': current['texts'][i]}
+                    for i, h in enumerate(current['hashes']) if h in added
+                ]
+
             if removed:
-                result['removed'] = [pdf for pdf in previous if pdf['hash'] in removed]
-            
+                result['removed'] = [
+                    {'url': previous['urls'][i], 'text': previous['texts'][i]}
+                    for i, h in enumerate(previous['hashes']) if h in removed
+                ]
+
             return result
-        
+
         return None
     
-    def _compare_lists(self, previous: List[str], current: List[str]) -> Optional[Dict]:
-        """Compare two lists and return differences"""
-        prev_set = set(previous)
-        curr_set = set(current)
-        
-        added = curr_set - prev_set
-        removed = prev_set - curr_set
-        
-        if added or removed:
+    def _compare_lists(self, previous: List[int], current: List[int],
+                       index: Dict[int, str]) -> Optional[Dict]:
+        """Compare two sorted id lists and return differences
+
+        Both lists are stored pre-sorted, so a two-pointer merge finds
+        added/removed ids in one linear, sequential pass without
+        building hash sets. Added entries are mapped back to URLs
+        through the current run's index; removed entries only exist as
+        ids (their URLs are no longer on the page).
+        """
+        if previous and isinstance(previous[0], str):
+            # Legacy string-URL state from before the id columns; hash
+            # to ids so the comparison stays meaningful
+            previous = sorted(
+                xxhash.xxh3_64_intdigest(u.encode('utf-8')) for u in previous
+            )
+
+        added_ids = []
+        removed_ids = []
+        i = j = 0
+        prev_len = len(previous)
+        curr_len = len(current)
+
+        while i < prev_len and j < curr_len:
+            prev_id = previous[i]
+            curr_id = current[j]
+            if prev_id == curr_id:
+                i += 1
+                j += 1
+            elif prev_id < curr_id:
+                removed_ids.append(prev_id)
+                i += 1
+            else:
+                added_ids.append(curr_id)
+                j += 1
+
+        removed_ids.extend(previous[i:])
+        added_ids.extend(current[j:])
+
+        if added_ids or removed_ids:
             result = {}
-            
-            if added:
-                result['added'] = list(added)
-            
-            if removed:
-                result['removed'] = list(removed)
-            
+
+            if added_ids:
+                result['added'] = [index[url_id] for url_id in added_ids]
+
+            if removed_ids:
+                result['removed'] = removed_ids
+
             return result
-        
+
         return None
     
     def _get_state_file_path(self, url: str) -> Path:
         """Get state file path for URL"""
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        return self.state_dir / f"state_{url_hash}.json"
-    
+        return self.state_dir / _url_to_state_filename(url)
+
     def _load_state(self, url: str) -> Optional[Dict]:
         """Load previous state from file"""
+        if url in self._state_cache:
+            return self._state_cache[url]
+
+        state = self._read_state_file(url)
+        self._state_cache[url] = state
+        return state
+
+    def _read_state_file(self, url: str) -> Optional[Dict]:
+        """Read and decode a state file from disk"""
         state_file = self._get_state_file_path(url)
-        
+
         try:
             if state_file.exists():
-                with open(state_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                compressed = state_file.read_bytes()
+                return msgpack.unpackb(zstd.ZstdDecompressor().decompress(compressed))
+
+            # One-time migration from the old JSON format, which named
+            # files by MD5; the next save writes the new format
+            legacy_file = self.state_dir / f"state_{hashlib.md5(url.encode()).hexdigest()}.json"
+            if legacy_file.exists():
+                return json.loads(legacy_file.read_text(encoding='utf-8'))
         except Exception as e:
             logger.error(f"Error loading state for {url}: {e}")
-        
+
         return None
-    
+
     def _save_state(self, url: str, state: Dict) -> None:
         """Save current state to file"""
         state_file = self._get_state_file_path(url)
-        
+
         try:
-            with open(state_file, 'w', encoding='utf-8') as f:
-                json.dump(state, f, indent=2, ensure_ascii=False)
+            packed = msgpack.packb(state)
+            # Write to a temp file and rename so a crash mid-write never
+            # leaves a truncated state file behind
+            tmp_file = state_file.with_suffix('.tmp')
+            tmp_file.write_bytes(zstd.ZstdCompressor(level=3).compress(packed))
+            os.replace(tmp_file, state_file)
+            self._state_cache[url] = state
         except Exception as e:
             logger.error(f"Error saving state for {url}: {e}")
     
@@ -275,7 +473,7 @@ class ChangeDetector:
         current_time = time.time()
         max_age_seconds = max_age_days * 24 * 60 * 60
         
-        for state_file in self.state_dir.glob("state_*.json"):
+        for state_file in self.state_dir.glob("state_*"):
             try:
                 if current_time - state_file.stat().st_mtime > max_age_seconds:
                     state_file.unlink()
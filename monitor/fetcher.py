@@ -4,6 +4,7 @@ HTTP fetcher module with retry functionality
 import requests
 import time
 import logging
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, Any
 from urllib.parse import urlparse
 
@@ -19,43 +20,79 @@ class SiteFetcher:
         # Set up session with reasonable defaults
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept-Encoding': 'gzip, deflate, br'
         })
+
+        # Pool enough connections for parallel fetching; the default
+        # pool of 10 throttles the thread pool and drops keep-alive
+        # connections when the same host appears multiple times
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
-    def fetch(self, url: str) -> Optional[str]:
+    def fetch(self, url: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Fetch content from URL with retry logic
-        
+
         Args:
             url: URL to fetch
-            
+            etag: ETag from a previous response, sent as If-None-Match
+            last_modified: Last-Modified from a previous response, sent
+                as If-Modified-Since
+
         Returns:
-            HTML content as string, or None if failed
+            Dictionary with 'content', 'not_modified', 'etag' and
+            'last_modified' keys, or None if failed
         """
         if not self._is_valid_url(url):
             logger.error(f"Invalid URL format: {url}")
             return None
-        
+
+        # Conditional request headers let the server answer 304 with no
+        # body when nothing changed
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
         for attempt in range(self.max_retries + 1):
             try:
                 logger.debug(f"Fetching {url} (attempt {attempt + 1}/{self.max_retries + 1})")
-                
+
                 response = self.session.get(
                     url,
                     timeout=self.timeout,
-                    allow_redirects=True
+                    allow_redirects=True,
+                    headers=headers
                 )
-                
+
+                if response.status_code == 304:
+                    logger.info(f"Not modified (304): {url}")
+                    return {
+                        'content': None,
+                        'not_modified': True,
+                        'etag': etag,
+                        'last_modified': last_modified
+                    }
+
                 # Check if request was successful
                 response.raise_for_status()
-                
+
                 # Check content type
                 content_type = response.headers.get('content-type', '').lower()
                 if 'text/html' not in content_type and 'application/xhtml' not in content_type:
                     logger.warning(f"Non-HTML content type for {url}: {content_type}")
-                
+
                 logger.info(f"Successfully fetched {url} ({len(response.text)} chars)")
-                return response.text
+                return {
+                    'content': response.text,
+                    'not_modified': False,
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified')
+                }
                 
             except requests.exceptions.RequestException as e:
                 logger.warning(f"Request failed for {url} (attempt {attempt + 1}): {e}")
@@ -74,7 +111,8 @@ class SiteFetcher:
         
         return None
     
-    def _is_valid_url(self, url: str) -> bool:
+    @staticmethod
+    def _is_valid_url(url: str) -> bool:
         """Validate URL format"""
         try:
             parsed = urlparse(url)
@@ -2,8 +2,10 @@
 Gmail sender module for notification emails
 """
 import os
+import ssl
 import smtplib
 import logging
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Tuple, Dict, Any
@@ -11,12 +13,50 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Static email fragments; only the per-run header and per-site blocks
+# are formatted at send time
+_HTML_HEAD = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>
+                body { font-family: Arial, sans-serif; margin: 20px; }
+                .header { background-color: #f0f8ff; padding: 20px; border-radius: 5px; margin-bottom: 20px; }
+                .site-block { border: 1px solid #ddd; margin: 15px 0; padding: 15px; border-radius: 5px; }
+                .site-url { font-weight: bold; color: #0066cc; margin-bottom: 10px; }
+                .change-item { margin: 8px 0; padding: 8px; background-color: #f9f9f9; border-radius: 3px; }
+                .added { color: #008000; }
+                .removed { color: #cc0000; }
+                .modified { color: #ff6600; }
+                .pdf-link { background-color: #fff0f0; padding: 5px; margin: 3px 0; border-radius: 3px; }
+                .footer { margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }
+            </style>
+        </head>
+        <body>
+"""
+
+_HTML_FOOTER = """
+            <div class="footer">
+                <p>このメールは GitHub Actions によって自動送信されました。</p>
+                <p>🤖 Generated with Claude Code</p>
+            </div>
+        </body>
+        </html>
+        """
+
+_TEXT_FOOTER = """
+---
+このメールは GitHub Actions によって自動送信されました。
+🤖 Generated with Claude Code
+"""
+
 
 class GmailSender:
     def __init__(self):
         # Get credentials from environment
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
+        self.smtp_port = int(os.getenv('SMTP_PORT', '465'))
         self.smtp_user = os.getenv('SMTP_USER')
         self.smtp_pass = os.getenv('SMTP_PASSWORD')
         self.mail_to = os.getenv('RECIPIENT_EMAIL', '').split(',')
@@ -78,183 +118,172 @@ class GmailSender:
     def _generate_html_content(self, changes: List[Tuple[str, Dict]]) -> str:
         """Generate HTML email content"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ background-color: #f0f8ff; padding: 20px; border-radius: 5px; margin-bottom: 20px; }}
-                .site-block {{ border: 1px solid #ddd; margin: 15px 0; padding: 15px; border-radius: 5px; }}
-                .site-url {{ font-weight: bold; color: #0066cc; margin-bottom: 10px; }}
-                .change-item {{ margin: 8px 0; padding: 8px; background-color: #f9f9f9; border-radius: 3px; }}
-                .added {{ color: #008000; }}
-                .removed {{ color: #cc0000; }}
-                .modified {{ color: #ff6600; }}
-                .pdf-link {{ background-color: #fff0f0; padding: 5px; margin: 3px 0; border-radius: 3px; }}
-                .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
+
+        parts = [
+            _HTML_HEAD,
+            f"""            <div class="header">
                 <h2>🔍 サイト更新検知通知</h2>
                 <p><strong>検知時刻:</strong> {timestamp}</p>
                 <p><strong>更新サイト数:</strong> {len(changes)}件</p>
             </div>
         """
-        
+        ]
+
         for url, change_data in changes:
-            html += self._generate_site_change_html(url, change_data)
-        
-        html += """
-            <div class="footer">
-                <p>このメールは GitHub Actions によって自動送信されました。</p>
-                <p>🤖 Generated with Claude Code</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return html
+            parts.append(self._generate_site_change_html(url, change_data))
+
+        parts.append(_HTML_FOOTER)
+
+        return ''.join(parts)
     
     def _generate_site_change_html(self, url: str, change_data: Dict) -> str:
         """Generate HTML for a single site's changes"""
         changes = change_data.get('changes', {})
-        
-        html = f"""
+
+        parts = [f"""
         <div class="site-block">
             <div class="site-url">📄 <a href="{url}">{url}</a></div>
-        """
-        
+        """]
+
         # Content changes
         if changes.get('content_changed'):
             text_change = changes.get('text_length_change', 0)
             direction = "増加" if text_change > 0 else "減少"
-            html += f'<div class="change-item modified">📝 コンテンツが変更されました (文字数: {abs(text_change)}{direction})</div>'
-        
+            parts.append(f'<div class="change-item modified">📝 コンテンツが変更されました (文字数: {abs(text_change)}{direction})</div>')
+
         # PDF changes
         if 'pdf_changes' in changes:
             pdf_changes = changes['pdf_changes']
-            
+
             if 'added' in pdf_changes:
-                html += '<div class="change-item added">📄 <strong>新しいPDFファイル:</strong></div>'
+                parts.append('<div class="change-item added">📄 <strong>新しいPDFファイル:</strong></div>')
                 for pdf in pdf_changes['added']:
-                    html += f'<div class="pdf-link added">+ <a href="{pdf["url"]}">{pdf["text"] or "PDF"}</a></div>'
-            
+                    parts.append(f'<div class="pdf-link added">+ <a href="{pdf["url"]}">{pdf["text"] or "PDF"}</a></div>')
+
             if 'removed' in pdf_changes:
-                html += '<div class="change-item removed">📄 <strong>削除されたPDFファイル:</strong></div>'
+                parts.append('<div class="change-item removed">📄 <strong>削除されたPDFファイル:</strong></div>')
                 for pdf in pdf_changes['removed']:
-                    html += f'<div class="pdf-link removed">- {pdf["text"] or "PDF"}</div>'
-        
+                    parts.append(f'<div class="pdf-link removed">- {pdf["text"] or "PDF"}</div>')
+
         # Link changes
         if 'link_changes' in changes:
             link_changes = changes['link_changes']
-            
+
             if 'added' in link_changes:
-                html += f'<div class="change-item added">🔗 新しいリンク: {len(link_changes["added"])}個</div>'
-            
+                parts.append(f'<div class="change-item added">🔗 新しいリンク: {len(link_changes["added"])}個</div>')
+
             if 'removed' in link_changes:
-                html += f'<div class="change-item removed">🔗 削除されたリンク: {len(link_changes["removed"])}個</div>'
-        
+                parts.append(f'<div class="change-item removed">🔗 削除されたリンク: {len(link_changes["removed"])}個</div>')
+
         # Image changes
         if 'image_changes' in changes:
             image_changes = changes['image_changes']
-            
+
             if 'added' in image_changes:
-                html += f'<div class="change-item added">🖼️ 新しい画像: {len(image_changes["added"])}個</div>'
-            
+                parts.append(f'<div class="change-item added">🖼️ 新しい画像: {len(image_changes["added"])}個</div>')
+
             if 'removed' in image_changes:
-                html += f'<div class="change-item removed">🖼️ 削除された画像: {len(image_changes["removed"])}個</div>'
-        
+                parts.append(f'<div class="change-item removed">🖼️ 削除された画像: {len(image_changes["removed"])}個</div>')
+
         # Update indicators
         if changes.get('update_indicators_changed'):
-            html += '<div class="change-item modified">🔄 更新インジケーターが変更されました</div>'
-        
+            parts.append('<div class="change-item modified">🔄 更新インジケーターが変更されました</div>')
+
         # Initial setup
         if changes.get('type') == 'initial':
-            html += '<div class="change-item">🆕 初回監視設定が完了しました</div>'
-        
-        html += '</div>'
-        
-        return html
+            parts.append('<div class="change-item">🆕 初回監視設定が完了しました</div>')
+
+        parts.append('</div>')
+
+        return ''.join(parts)
     
     def _generate_text_content(self, changes: List[Tuple[str, Dict]]) -> str:
         """Generate plain text email content"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        text = f"""
+        parts = [f"""
 サイト更新検知通知
 
 検知時刻: {timestamp}
 更新サイト数: {len(changes)}件
 
-"""
-        
+"""]
+
         for url, change_data in changes:
-            text += f"URL: {url}\\n"
-            
+            parts.append(f"URL: {url}\\n")
+
             changes_dict = change_data.get('changes', {})
-            
+
             if changes_dict.get('content_changed'):
-                text += "- コンテンツが変更されました\\n"
-            
+                parts.append("- コンテンツが変更されました\\n")
+
             if 'pdf_changes' in changes_dict:
                 pdf_changes = changes_dict['pdf_changes']
-                
+
                 if 'added' in pdf_changes:
-                    text += f"- 新しいPDFファイル: {len(pdf_changes['added'])}個\\n"
-                
+                    parts.append(f"- 新しいPDFファイル: {len(pdf_changes['added'])}個\\n")
+
                 if 'removed' in pdf_changes:
-                    text += f"- 削除されたPDFファイル: {len(pdf_changes['removed'])}個\\n"
-            
+                    parts.append(f"- 削除されたPDFファイル: {len(pdf_changes['removed'])}個\\n")
+
             if 'link_changes' in changes_dict:
                 link_changes = changes_dict['link_changes']
-                
+
                 if 'added' in link_changes:
-                    text += f"- 新しいリンク: {len(link_changes['added'])}個\\n"
-                
+                    parts.append(f"- 新しいリンク: {len(link_changes['added'])}個\\n")
+
                 if 'removed' in link_changes:
-                    text += f"- 削除されたリンク: {len(link_changes['removed'])}個\\n"
-            
+                    parts.append(f"- 削除されたリンク: {len(link_changes['removed'])}個\\n")
+
             if changes_dict.get('type') == 'initial':
-                text += "- 初回監視設定が完了しました\\n"
-            
-            text += "\\n"
-        
-        text += """
----
-このメールは GitHub Actions によって自動送信されました。
-🤖 Generated with Claude Code
-"""
-        
-        return text
+                parts.append("- 初回監視設定が完了しました\\n")
+
+            parts.append("\\n")
+
+        parts.append(_TEXT_FOOTER)
+
+        return ''.join(parts)
     
-    def _send_email(self, msg: MIMEMultipart) -> None:
-        """Send email via SMTP"""
-        try:
-            # Create SMTP session
+    @contextmanager
+    def session(self):
+        """
+        Yield a logged-in SMTP connection
+
+        Port 465 speaks implicit TLS (SMTP_SSL), which skips the
+        plaintext connect-then-STARTTLS upgrade round-trip; any other
+        port (587, 25) connects plaintext and upgrades via STARTTLS.
+        Callers can send several messages on one connection without
+        re-authenticating.
+        """
+        context = ssl.create_default_context()
+
+        if self.smtp_port == 465:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context)
+        else:
             server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()  # Enable TLS
+
+        try:
+            if self.smtp_port != 465:
+                server.starttls(context=context)
             server.login(self.smtp_user, self.smtp_pass)
-            
-            # Send email
-            text = msg.as_string()
-            server.sendmail(self.smtp_user, self.mail_to, text)
+            yield server
+        finally:
             server.quit()
-            
+
+    def _send_email(self, msg: MIMEMultipart) -> None:
+        """Send email via SMTP"""
+        try:
+            with self.session() as server:
+                server.sendmail(self.smtp_user, self.mail_to, msg.as_string())
         except Exception as e:
             logger.error(f"SMTP error: {e}")
             raise
-    
+
     def test_connection(self) -> bool:
         """Test SMTP connection"""
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_user, self.smtp_pass)
-            server.quit()
+            with self.session():
+                pass
             logger.info("SMTP connection test successful")
             return True
         except Exception as e:
@@ -5,6 +5,7 @@ Site monitoring main module
 import os
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
@@ -28,31 +29,74 @@ class SiteMonitor:
         self.fetcher = SiteFetcher()
         self.detector = ChangeDetector(self.state_dir)
         self.mailer = GmailSender()
-    
-    def load_urls(self) -> List[str]:
-        """Load URLs from file"""
+
+        self._urls_cache: Optional[Tuple[float, Tuple[str, ...]]] = None
+
+    def load_urls(self) -> Tuple[str, ...]:
+        """Load URLs from file, deduplicated and validated
+
+        Duplicate lines would cost a full fetch (and state write) each,
+        and malformed URLs would burn a retry/timeout cycle, so both are
+        dropped here. The parsed tuple is memoized against the file's
+        mtime for repeated calls within a process.
+        """
         try:
-            with open(self.urls_file, 'r', encoding='utf-8') as f:
-                urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-            logger.info(f"Loaded {len(urls)} URLs from {self.urls_file}")
-            return urls
-        except FileNotFoundError:
+            mtime = os.path.getmtime(self.urls_file)
+        except OSError:
             logger.error(f"URLs file not found: {self.urls_file}")
-            return []
+            return ()
+
+        if self._urls_cache and self._urls_cache[0] == mtime:
+            return self._urls_cache[1]
+
+        seen = set()
+        urls = []
+        with open(self.urls_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                url = line.strip()
+                if not url or url.startswith('#') or url in seen:
+                    continue
+                if not SiteFetcher._is_valid_url(url):
+                    logger.warning(f"Skipping invalid URL in {self.urls_file}: {url}")
+                    continue
+                seen.add(url)
+                urls.append(url)
+
+        logger.info(f"Loaded {len(urls)} URLs from {self.urls_file}")
+        self._urls_cache = (mtime, tuple(urls))
+        return self._urls_cache[1]
     
     def process_url(self, url: str) -> Optional[Tuple[str, Dict]]:
         """Process a single URL and return change information"""
         try:
             logger.info(f"Processing URL: {url}")
             
-            # Fetch current content
-            content = self.fetcher.fetch(url)
-            if not content:
+            # Fetch current content, using stored validators so the
+            # server can answer 304 for unchanged pages
+            conditional = self.detector.get_conditional_headers(url)
+            result = self.fetcher.fetch(
+                url,
+                etag=conditional['etag'],
+                last_modified=conditional['last_modified']
+            )
+            if not result:
                 logger.warning(f"Failed to fetch content from {url}")
                 return None
-            
+
+            if result['not_modified']:
+                logger.info(f"No changes detected for {url} (server reported 304)")
+                self.detector.touch_state(url)
+                return None
+
             # Detect changes
-            changes = self.detector.detect_changes(url, content)
+            changes = self.detector.detect_changes(
+                url,
+                result['content'],
+                response_meta={
+                    'etag': result['etag'],
+                    'last_modified': result['last_modified']
+                }
+            )
             
             if changes:
                 logger.info(f"Changes detected for {url}")
@@ -73,11 +117,14 @@ class SiteMonitor:
             return
         
         changes_detected = []
-        
-        for url in urls:
-            result = self.process_url(url)
-            if result:
-                changes_detected.append(result)
+
+        # Fetching is network-bound, so process URLs in parallel; state
+        # files are per-URL, so workers never touch the same file
+        max_workers = min(16, len(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for result in executor.map(self.process_url, urls):
+                if result:
+                    changes_detected.append(result)
         
         if changes_detected:
             logger.info(f"Total changes detected: {len(changes_detected)}")